@@ -1,9 +1,9 @@
 import os, sys, logging
 import json
+import hashlib
 import numpy as np
-import random
-from collections import defaultdict, Counter
-import cPickle as pickle
+from collections import defaultdict
+import pickle
 
 import cProfile, pstats
 import threading
@@ -11,14 +11,13 @@ import time
 import multiprocessing
 import math
 
-from sklearn import metrics
 from sklearn import svm
 from sklearn.naive_bayes import GaussianNB
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 
 from src.datasets import data_utils
-from src.datasets.data_utils import timed, TextTooShortException, DataSampler, WordVectorBuilder
+from src.datasets.data_utils import timed, timed_fast, TextTooShortException, DataSampler, WordVectorBuilder
 from src.datasets.imdb import IMDB
 from src.datasets.sentiment140 import Sentiment140
 from src.datasets.amazon_reviews import AmazonReviews
@@ -29,6 +28,22 @@ from src.datasets.word_vector_embedder import WordVectorEmbedder
 data_fraction_test = 0.20
 data_fraction_train = 0.80
 
+# number of texts embedded per batch (each batch gathers at most
+# WordVectorEmbedder.max_gather_words word vectors at a time)
+embed_batch_size = 4096
+
+# number of texts between progress messages while loading
+dataload_log_every = 100000
+
+# classifiers that use their own threads (trained outside the worker pool)
+multithreaded_classifiers = ('HistGradientBoosting',)
+
+# classifiers scored together by timed_testing_linear
+linear_classifier_types = (LogisticRegression, svm.LinearSVC)
+
+# widest input to train Gaussian NaiveBayes on by default
+naive_bayes_max_features = 100
+
 num_threads = multiprocessing.cpu_count()
 threadLock = threading.Lock()
 
@@ -42,6 +57,10 @@ try:
 except NameError:
     dir_results = os.path.join(dir_data, 'results')
 
+# embedded datasets cached across runs
+dir_cache = os.path.join(dir_data, 'cache')
+embedding_cache_names = ('values_train', 'labels_train', 'values_test', 'labels_test')
+
 # data inputs
 datasets =  [
 #                { 'sentiment140': {
@@ -287,26 +306,154 @@ datasets =  [
 
 
 
-def classifiers():
+def classifiers(dual=False, num_features=None):
     """
         Returns a list of classifier tuples (name, model)
         for use in training
-    """
-    return [("LogisticRegression", LogisticRegression(C=1.0,
-                                                      class_weight=None,
-                                                      dual=False,
-                                                      fit_intercept=True,
-                                                      intercept_scaling=1,
-                                                      penalty='l2',
-                                                      random_state=None,
-                                                      tol=0.0001)),
 
-           ("RandomForests", RandomForestClassifier(n_jobs=-1,
-                                                    n_estimators = 15,
-                                                    max_features = 'sqrt')),
-           ("Gaussian NaiveBayes", GaussianNB())] #,
-           #("LinearSVM", svm.LinearSVC())]
+        linear models use liblinear, solving the dual problem when
+        there are fewer samples than features (LinearSVC is the liblinear
+        equivalent of svm.SVC(kernel='linear') and much faster to train)
+
+        the tree ensemble is histogram gradient boosting (features binned
+        into uint8)
 
+        Gaussian NaiveBayes is skipped for wide inputs (more than
+        naive_bayes_max_features) unless BASELINE_NAIVE_BAYES=1
+    """
+    models = [("LogisticRegression", LogisticRegression(C=1.0,
+                                                        class_weight=None,
+                                                        dual=dual,
+                                                        fit_intercept=True,
+                                                        intercept_scaling=1,
+                                                        penalty='l2',
+                                                        random_state=None,
+                                                        solver='liblinear',
+                                                        tol=0.0001)),
+
+              ("LinearSVM", svm.LinearSVC(dual=dual,
+                                          loss='squared_hinge'))]
+
+    # tree ensemble
+    models.append(("HistGradientBoosting", HistGradientBoostingClassifier(max_iter=100,
+                                                                          max_bins=255,
+                                                                          early_stopping=True)))
+
+    # optional naive bayes
+    if os.environ.get('BASELINE_NAIVE_BAYES', '0') == '1' or (num_features is not None and num_features <= naive_bayes_max_features):
+        models.append(("Gaussian NaiveBayes", GaussianNB()))
+
+    return models
+
+
+
+
+def embedding_cache_key(*params):
+    '''
+        Hash of the parameters that determine a cached (tokenized or embedded) dataset
+    '''
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def embedding_cache_path(key, name):
+    return os.path.join(dir_cache, '{}_{}.npy'.format(key, name))
+
+
+def embedding_cache_load(key):
+    '''
+        Returns memory-mapped (values_train, labels_train, values_test, labels_test)
+        arrays and their metadata for a cached embedded dataset, or None if not cached
+    '''
+    path_info = os.path.join(dir_cache, '{}.json'.format(key))
+    if not os.path.isfile(path_info):
+        return None
+    with open(path_info, 'r') as f:
+        info = json.load(f)
+    arrays = tuple(np.load(embedding_cache_path(key, name), mmap_mode='r') for name in embedding_cache_names)
+    return arrays, info
+
+
+def embedding_cache_save(key, arrays, info):
+    '''
+        Saves (values_train, labels_train, values_test, labels_test) arrays
+        and their metadata for an embedded dataset
+    '''
+    if not os.path.isdir(dir_cache):
+        data_utils.mkdir_p(dir_cache)
+    for name, array in zip(embedding_cache_names, arrays):
+        np.save(embedding_cache_path(key, name), array)
+
+    # metadata is written last to mark the entry as complete
+    with open(os.path.join(dir_cache, '{}.json'.format(key)), 'w') as f:
+        json.dump(info, f)
+
+
+
+def tokenized_dataset(key, load_data, loader, args):
+    '''
+        Returns (token lists, labels, seconds loading) for a dataset, shared by
+        all embedders: tokenized with timed_tokenize on first use and saved as a
+        flat token array with offsets, loaded back from disk afterwards
+        (seconds are those spent in this call, tokenizing or loading)
+
+        @Arguments:
+            key         --  cache key from embedding_cache_key
+            load_data   --  function returning the (text,sentiment) samples
+                            (only called when not cached)
+    '''
+    path = os.path.join(dir_cache, '{}_tokens.npz'.format(key))
+    if os.path.isfile(path):
+        logger.info("loading cached tokens from {}...".format(path))
+        profile_results = timed_tokens_load(path)
+        tokens, labels = profile_results.results
+        return tokens, labels, profile_results.seconds
+
+    # tokenize
+    profile_results = timed_tokenize(loader, load_data(), args)
+    tokens, labels = profile_results.results
+
+    # save flat tokens with per-text offsets
+    flat_tokens = np.empty(sum(len(text_tokens) for text_tokens in tokens), dtype=object)
+    flat_tokens[:] = [token for text_tokens in tokens for token in text_tokens]
+    offsets = np.concatenate(([0], np.cumsum([len(text_tokens) for text_tokens in tokens], dtype=np.int64)))
+    if not os.path.isdir(dir_cache):
+        data_utils.mkdir_p(dir_cache)
+
+    # written to a temporary file and renamed into place, so an interrupted
+    # save never leaves a truncated archive behind
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, tokens=flat_tokens, offsets=offsets, labels=labels)
+    os.replace(path + '.tmp', path)
+    return tokens, labels, profile_results.seconds
+
+
+def load_pickled_samples(path):
+    '''
+        Load (text,sentiment) samples pickled by WordVectorBuilder
+        (python 2 pickled str texts load as bytes)
+    '''
+    with open(path, 'rb') as f:
+        return pickle.load(f, encoding='bytes')
+
+
+def training_worker(classifier, cache_key):
+    '''
+        Fit classifier on the cached training set of an embedded dataset,
+        returning the fitted classifier and its training time
+    '''
+    (values_train, labels_train, values_test, labels_test), cache_info = embedding_cache_load(cache_key)
+    profile_results = timed_training(classifier, values_train, labels_train)
+    return profile_results.results, profile_results.seconds
+
+
+def binary_confusion_matrix(labels, predictions):
+    '''
+        2x2 confusion matrix [[TN, FP], [FN, TP]] of 0/1 labels and predictions,
+        counted in one pass
+    '''
+    labels = np.asarray(labels).astype(np.int8, copy=False)
+    predictions = np.asarray(predictions).astype(np.int8, copy=False)
+    return np.bincount(2 * labels + predictions, minlength=4).reshape(2, 2)
 
 
 
@@ -320,263 +467,366 @@ def timed_testing(classifier, values):
     return classifier.predict(values)
 
 @timed
-def timed_dataload(loader, data, args, embedder, values, labels):
-
-    # use separate counter to account for invalid input along the way
-    counter = 0
-
-    for text,sentiment in data:
+def timed_testing_linear(classifiers, values):
+    '''
+        Predict with several fitted binary linear classifiers at once by scoring
+        values against their stacked weights in a single matrix product
+
+        @Returns:
+            (len(values), len(classifiers)) int8 array of predicted labels
+    '''
+    weights = np.vstack([classifier.coef_ for classifier in classifiers]).astype(values.dtype)
+    intercepts = np.concatenate([np.ravel(classifier.intercept_) for classifier in classifiers]).astype(values.dtype)
+    scores = np.dot(values, weights.T) + intercepts
+
+    # positive scores predict the second class, as in LinearClassifierMixin.predict
+    # (thresholded straight into an int8 buffer, which already holds 0/1 labels)
+    predictions = np.empty(scores.shape, dtype=np.int8)
+    np.greater(scores, 0, out=predictions.view(np.bool_))
+    classes = np.column_stack([classifier.classes_ for classifier in classifiers]).astype(np.int8)
+    if np.any(classes[0] != 0) or np.any(classes[1] != 1):
+        predictions = np.where(predictions, classes[1], classes[0])
+    return predictions
+
+@timed_fast
+def timed_tokens_load(path):
+    with np.load(path, allow_pickle=True) as cached:
+        flat_tokens = cached['tokens'].tolist()
+        offsets = cached['offsets']
+        labels = cached['labels']
+    return [flat_tokens[start:end] for start, end in zip(offsets[:-1], offsets[1:])], labels
+
+@timed_fast
+def timed_cache_load(key):
+    return embedding_cache_load(key)
+
+@timed_fast
+def timed_tokenize(loader, data, args):
+
+    # resolve per-dataset options once rather than per sample
+    has_normalize = 'normalize' in args
+    normalize_args = args.get('normalize', {})
+    form = args.get('load', {}).get('form', None)
+
+    # bind functions used per sample to locals
+    normalize = data_utils.normalize
+    if form == 'hanzi':
+        tokenize = data_utils.tokenize_hanzi
+    elif form == 'arabic':
+        tokenize = lambda text: loader.tokenize_arabic(loader.twitter_strip(text))
+    else:
+        tokenize = data_utils.tokenize
+    info_enabled = logger.isEnabledFor(logging.INFO)
+
+    # token lists and labels of valid samples
+    tokens = []
+    labels = []
+    tokens_append = tokens.append
+    labels_append = labels.append
+
+    for i,(text,sentiment) in enumerate(data):
 
         try:
-            if (counter % 10000 == 0):
-                print("Loading at {}".format(counter))
+            if info_enabled and i % dataload_log_every == 0:
+                logger.info("Tokenizing %d (%s)...", i, sentiment)
 
             # normalize and tokenize if necessary
-            if args.has_key('normalize'):
-                text_normalized = data_utils.normalize(text, **args['normalize'])
+            if has_normalize:
+                text_normalized = normalize(text, **normalize_args)
             else:
                 text_normalized = text
 
             # tokenize
-            if args.get('load', {}).get('form', None) == 'hanzi':
-                tokens = data_utils.tokenize_hanzi(text_normalized)
-            elif args.get('load', {}).get('form', None) == 'arabic':
-                text_stripped = loader.twitter_strip(text_normalized)
-                tokens = loader.tokenize_arabic(text_stripped)
-            else:
-                tokens = data_utils.tokenize(text_normalized)
-
-            # choose embedding type
-            vector = None
-            if args['embed']['type'] == 'concatenated':
-                vector = embedder.embed_words_into_vectors_concatenated(tokens, **self.args['embed'])
-            elif args['embed']['type'] == 'averaged':
-                vector = embedder.embed_words_into_vectors_averaged(tokens)
-            else:
-                pass
-
-            # data labeled by sentiment score (thread-safe with lock)
-            if vector is not None:
-                values.append(vector)
-                labels.append(sentiment)
-                counter += 1
+            tokens_append(tokenize(text_normalized))
+            labels_append(sentiment)
 
         except TextTooShortException as e:
             pass
 
+    return tokens, np.array(labels, dtype=np.float32)
 
-# iterate all datasources
-for dataset in datasets:
-    for data_source, data_params in dataset.iteritems():
-
-        # prepare data loader
-        klass = data_params['class']
-        loader = klass(data_params['path'])
-        data_args = data_params['args']
-        load_args = data_args.get('load', {})
-        data = loader.load_data(**load_args)
-
-        # test all vector models
-        for embedder_model in data_args['models']:
+@timed_fast
+def timed_dataload(tokens, labels, args, embedder, num_features):
 
-            # identify prebuilt model if exists
-            if isinstance(embedder_model, dict):
+    # resolve per-dataset options once rather than per sample
+    embed_type = args['embed']['type']
+    embed_num_features = args['embed'].get('num_features', None)
+    embed_concatenated = embedder.embed_words_into_vectors_concatenated
+    info_enabled = logger.isEnabledFor(logging.INFO)
 
-                # initialize word vector embedder
-                embedder_model, prebuilt_model_params = embedder_model.items().pop()
-                prebuilt_path_model = prebuilt_model_params.get('model', None)
-                model_args = prebuilt_model_params.get('args', {})
-                embedder = WordVectorEmbedder(embedder_model, model_fullpath=prebuilt_path_model, model_args=model_args)
+    # preallocate outputs for every sample (trimmed to valid samples at the end)
+    if embed_type == 'concatenated':
+        num_features = num_features * embed_num_features
+    values = np.empty((len(tokens), num_features), dtype=np.float32)
+    labels_valid = np.empty(len(tokens), dtype=np.float32)
 
-                # update embedder parameters
-                if prebuilt_path_model:
-                    model_path_dir, model_path_filename, model_path_filext = WordVectorBuilder.filename_components(prebuilt_path_model)
-                    embedder.model_subset = model_path_filename
+    # use separate counter to account for invalid input along the way
+    counter = 0
 
-                # training data (custom or default)
-                if prebuilt_model_params.get('train', None):
-                    prebuilt_path_train = prebuilt_model_params.get('train')
-                else:
-                    prebuilt_path_train = WordVectorBuilder.filename_train(prebuilt_path_model)
-                with open(prebuilt_path_train, 'rb') as f:
-                    data_train = pickle.load(f)
+    # concatenated embeddings are built one text at a time
+    if embed_type == 'concatenated':
+        for i,(text_tokens,sentiment) in enumerate(zip(tokens, labels)):
+            if info_enabled and i % dataload_log_every == 0:
+                logger.info("Embedding %d (%s)...", i, sentiment)
+            values[counter] = embed_concatenated(text_tokens, num_features=embed_num_features)
+            labels_valid[counter] = sentiment
+            counter += 1
+
+    # averaged embeddings are built in batches with vectorized gathers
+    elif embed_type == 'averaged':
+        for start in range(0, len(tokens), embed_batch_size):
+            if info_enabled and start % dataload_log_every < embed_batch_size:
+                logger.info("Embedding %d...", start)
+            counter = embed_batch(embedder, tokens[start:start+embed_batch_size], labels[start:start+embed_batch_size], values, labels_valid, counter)
+
+    # drop rows reserved for invalid input
+    return values[:counter], labels_valid[:counter]
+
+
+def embed_batch(embedder, batch_tokens, batch_labels, values, labels, counter):
+    '''
+        Embed a batch of tokenized texts into values/labels starting at row counter,
+        returning the counter advanced past the valid texts
+    '''
+    vectors, valid = embedder.embed_batch_into_vectors_averaged(batch_tokens)
+    num_valid = np.count_nonzero(valid)
+    values[counter:counter+num_valid] = vectors[valid]
+    labels[counter:counter+num_valid] = np.asarray(batch_labels)[valid]
+    return counter + num_valid
+
+
+if __name__ == '__main__':
+
+    # iterate all datasources
+    for dataset in datasets:
+        for data_source, data_params in dataset.items():
+
+            # prepare data loader
+            klass = data_params['class']
+            loader = klass(data_params['path'])
+            data_args = data_params['args']
+            load_args = data_args.get('load', {})
+            data = loader.load_data(**load_args)
+
+            # test all vector models
+            for embedder_model in data_args['models']:
+
+                # identify prebuilt model if exists
+                prebuilt_model_params = None
+                if isinstance(embedder_model, dict):
+                    embedder_model, prebuilt_model_params = list(embedder_model.items()).pop()
+
+                # reuse embedded dataset from a previous run if available
+                # (keyed on everything that changes its tokens, including the arabic tokenizer)
+                embedding_args = dict((key, value) for key, value in data_args.items() if key != 'models')
+                tokenize_args = dict((key, value) for key, value in data_args.items() if key in ('load', 'normalize', 'min_samples'))
+                if load_args.get('form', None) == 'arabic':
+                    embedding_args['arabic_tokenizer'] = tokenize_args['arabic_tokenizer'] = os.environ.get('ARABIC_TOKENIZER', 'nltk')
+                cache_key = embedding_cache_key(data_source, data_params['path'], embedding_args, embedder_model, prebuilt_model_params)
+                profile_results = timed_cache_load(cache_key)
+                cached = profile_results.results
+
+                # loading time measured in this run, and the one recorded when a reused embedding was built
+                seconds_loading_cached = None
+                if cached is not None:
+                    logger.info("loading cached {} embedding of {}...".format(embedder_model, data_source))
+                    (values_train, labels_train, values_test, labels_test), cache_info = cached
+                    model_subset = cache_info['subset']
+                    seconds_loading = profile_results.seconds
+                    seconds_loading_cached = cache_info['time_in_seconds_loading']
+
+                elif prebuilt_model_params is not None:
+
+                    # initialize word vector embedder
+                    prebuilt_path_model = prebuilt_model_params.get('model', None)
+                    model_args = prebuilt_model_params.get('args', {})
+                    embedder = WordVectorEmbedder(embedder_model, model_fullpath=prebuilt_path_model, model_args=model_args)
+
+                    # update embedder parameters
+                    if prebuilt_path_model:
+                        model_path_dir, model_path_filename, model_path_filext = WordVectorBuilder.filename_components(prebuilt_path_model)
+                        embedder.model_subset = model_path_filename
+
+                    # training data (custom or default)
+                    if prebuilt_model_params.get('train', None):
+                        prebuilt_path_train = prebuilt_model_params.get('train')
+                    else:
+                        prebuilt_path_train = WordVectorBuilder.filename_train(prebuilt_path_model)
+
+                    # testing data (custom or default)
+                    if prebuilt_model_params.get('test', None):
+                        prebuilt_path_test = prebuilt_model_params.get('test')
+                    else:
+                        prebuilt_path_test = WordVectorBuilder.filename_test(prebuilt_path_model)
+
+                    # tokenize (or load tokens shared with other embedders)
+                    tokens_train, labels_train, seconds_tokenizing_train = tokenized_dataset(embedding_cache_key('tokens', data_source, prebuilt_path_train, tokenize_args),
+                                                                                             lambda: load_pickled_samples(prebuilt_path_train), loader, data_args)
+                    tokens_test, labels_test, seconds_tokenizing_test = tokenized_dataset(embedding_cache_key('tokens', data_source, prebuilt_path_test, tokenize_args),
+                                                                                          lambda: load_pickled_samples(prebuilt_path_test), loader, data_args)
+
+                    # initialize timer
+                    seconds_loading = seconds_tokenizing_train + seconds_tokenizing_test
+                    logger.info("processing {} samples from {}...".format(len(tokens_train)+len(tokens_test), prebuilt_path_model))
+
+                    # load training dataset
+                    profile_results = timed_dataload(tokens_train, labels_train, data_args, embedder, embedder.num_features())
+                    values_train, labels_train = profile_results.results
+                    seconds_loading += profile_results.seconds
+
+                    # load testing dataset
+                    profile_results = timed_dataload(tokens_test, labels_test, data_args, embedder, embedder.num_features())
+                    values_test, labels_test = profile_results.results
+                    seconds_loading += profile_results.seconds
+
+                    # shuffle if necessary
+                    if data_args['shuffle_after_load']:
+
+                        # reorder arrays by random permutations of their indices
+                        rng = np.random.RandomState(data_args.get('load', {}).get('rng_seed', None))
+                        indices_train = rng.permutation(len(values_train))
+                        indices_test = rng.permutation(len(values_test))
+                        values_train = values_train[indices_train]
+                        labels_train = labels_train[indices_train]
+                        values_test = values_test[indices_test]
+                        labels_test = labels_test[indices_test]
 
-                # testing data (custom or default)
-                if prebuilt_model_params.get('test', None):
-                    prebuilt_path_test = prebuilt_model_params.get('test')
                 else:
-                    prebuilt_path_test = WordVectorBuilder.filename_test(prebuilt_path_model)
-                with open(prebuilt_path_test, 'rb') as f:
-                    data_test = pickle.load(f)
-
-                # initialize lists (will be converted later into numpy arrays)
-                values_train = []
-                labels_train = []
-                values_test = []
-                labels_test = []
-
-                # initialize timer
-                seconds_loading = 0
-                logger.info("processing {} samples from {}...".format(len(data_train)+len(data_test), prebuilt_path_model))
-
-                # load training dataset
-                profile_results = timed_dataload(loader, data_train, data_args, embedder, values_train, labels_train)
-                seconds_loading += profile_results.timer.total_tt
-
-                # load training dataset
-                profile_results = timed_dataload(loader, data_test, data_args, embedder, values_test, labels_test)
-                seconds_loading += profile_results.timer.total_tt
-
-                # shuffle if necessary
-                if data_args['shuffle_after_load']:
-
-                    # store new lists
-                    values_train_shuffled = []
-                    labels_train_shuffled = []
-                    values_test_shuffled = []
-                    labels_test_shuffled = []
-
-                    # generate subsample of random indices out of total available
-                    random.seed(data_args.get('load', {}).get('rng_seed', None))
-                    indices_train = range(len(values_train))
-                    indices_test = range(len(values_test))
-                    random.shuffle(indices_train)
-                    random.shuffle(indices_test)
-
-                    # keep entries at those random indices
-                    for i in indices_train:
-                        values_train_shuffled.append(values_train[i])
-                        labels_train_shuffled.append(labels_train[i])
-                    for i in indices_test:
-                        values_test_shuffled.append(values_test[i])
-                        labels_test_shuffled.append(labels_test[i])
-
-                    # keep shuffled lists
-                    values_train = values_train_shuffled
-                    labels_train = labels_train_shuffled
-                    values_test = values_test_shuffled
-                    labels_test = labels_test_shuffled
-
-
-                # create numpy arrays for classifier input
-                values_train = np.array(values_train, dtype='float32')
-                labels_train = np.array(labels_train, dtype='float32')
-                values_test = np.array(values_test, dtype='float32')
-                labels_test = np.array(labels_test, dtype='float32')
-
-            else:
 
-                # initialize word vector embedder
-                embedder = WordVectorEmbedder(embedder_model)
-
-                # initialize lists (will be converted later into numpy arrays)
-                values = []
-                labels = []
-
-                # get equal-sized subsets of each class
-                data_sampler = DataSampler(klass, file_path=data_params['path'], num_classes=2)
-                data = data_sampler.sample_balanced(min_samples=data_args.get('min_samples', None), rng_seed=data_args.get('load', {}).get('rng_seed', None))
-
-                # load dataset
-                logger.info("processing {} samples from {}...".format(len(data), data_params['path']))
-                profile_results = timed_dataload(loader, data, data_args, embedder, values, labels)
-
-                # store loading time
-                seconds_loading = profile_results.timer.total_tt
-
-                # shuffle if necessary
-                if data_args['shuffle_after_load']:
-
-                    # store new lists
-                    values_shuffled = []
-                    labels_shuffled = []
-
-                    # generate subsample of random indices out of total available
-                    random.seed(data_args.get('load', {}).get('rng_seed', None))
-                    indices = range(len(values))
-                    random.shuffle(indices)
-
-                    # keep entries at those random indices
-                    for i in indices:
-                        values_shuffled.append(values[i])
-                        labels_shuffled.append(labels[i])
-
-                    # keep shuffled lists
-                    values = values_shuffled
-                    labels = labels_shuffled
-
-                # convert into nparray for sklearn
-                values = np.nan_to_num(np.array(values, dtype="float32"))
-                labels = np.nan_to_num(np.array(labels, dtype="float32"))
-                logger.info("Loaded {} samples...".format(len(values)))
-
-                # split into training and test data
-                logger.info("splitting dataset into training and testing sets...")
-                labels_train, labels_dev, labels_test = data_utils.split_data(labels, train=data_fraction_train, dev=0, test=data_fraction_test)
-                values_train, values_dev, values_test = data_utils.split_data(values, train=data_fraction_train, dev=0, test=data_fraction_test)
-
-
-            # calculate distribution
-            dist = Counter()
-            dist.update(labels_test)
-
-
-            # setup classifier
-            logger.info("Training on {}, Testing on {}...".format(len(values_train), len(values_test)))
-            for classifier_name,classifier in classifiers():
-
-                # profiled training
-                logger.info("Training %s classifier..." % classifier.__class__.__name__)
-                profile_results = timed_training(classifier, values_train, labels_train)
-                seconds_training = profile_results.timer.total_tt
-                # profiled testing
-                logger.info("Testing %s classifier..." % classifier.__class__.__name__)
-                profile_results = timed_testing(classifier, values_test)
-                predictions = profile_results.results
-                seconds_testing = profile_results.timer.total_tt
-                # calculate metrics
-                data_size           = len(labels_test)
-                data_positive       = np.sum(labels_test)
-                data_negative       = data_size - data_positive
-                confusion_matrix    = metrics.confusion_matrix(labels_test, predictions)
-                TN                  = confusion_matrix[0][0]
-                FP                  = confusion_matrix[0][1]
-                FN                  = confusion_matrix[1][0]
-                TP                  = confusion_matrix[1][1]
-                accuracy            = metrics.accuracy_score(labels_test, predictions)
-                precision           = metrics.precision_score(labels_test, predictions)
-                recall              = metrics.recall_score(labels_test, predictions)
-                f1                  = metrics.f1_score(labels_test, predictions)
-                # build results object
-                results = { 'classifier':   str(classifier.__class__.__name__),
-                            'data':    {    'source':                   str(data_source),
-                                            'testsize':                 str(data_size),
-                                            'positive':                 str(data_positive),
-                                            'negative':                 str(data_negative),
-                                            'time_in_seconds_loading':  str(seconds_loading)
-                                       },
-                            'embedding': {  'model':                    str(embedder_model),
-                                            'subset':                   str(embedder.model_subset)
-                                        },
-                            'data_args':    data_args,
-                            'metrics': {    'TP':                       str(TP),
-                                            'FP':                       str(FP),
-                                            'TN':                       str(TN),
-                                            'FN':                       str(FN),
-                                            'accuracy':                 str(accuracy),
-                                            'precision':                str(precision),
-                                            'recall':                   str(recall),
-                                            'f1':                       str(f1),
-                                            'time_in_seconds_training': str(seconds_training),
-                                            'time_in_seconds_testing':  str(seconds_testing)
-                                        }
-                           }
-                # ensure output directory exists
-                if not os.path.isdir(dir_results):
-                    data_utils.mkdir_p(dir_results)
-                # save json file
-                filename_results = "{}_{}_{}.json".format(data_source, embedder_model, classifier.__class__.__name__)
-                logger.info("Saving results to {}...".format(filename_results))
-                with open(os.path.join(dir_results,filename_results), 'a') as outfile:
-                    json.dump(results, outfile, sort_keys=True, indent=4, separators=(',', ': '))
-                    outfile.write('\n')
+                    # initialize word vector embedder
+                    embedder = WordVectorEmbedder(embedder_model)
+
+                    # get equal-sized subsets of each class and tokenize (or load tokens shared with other embedders)
+                    data_sampler = DataSampler(klass, file_path=data_params['path'], num_classes=2)
+                    tokens, labels, seconds_tokenizing = tokenized_dataset(embedding_cache_key('tokens', data_source, data_params['path'], tokenize_args),
+                                                                           lambda: data_sampler.sample_balanced(min_samples=data_args.get('min_samples', None), rng_seed=data_args.get('load', {}).get('rng_seed', None)),
+                                                                           loader, data_args)
+
+                    # load dataset
+                    logger.info("processing {} samples from {}...".format(len(tokens), data_params['path']))
+                    profile_results = timed_dataload(tokens, labels, data_args, embedder, embedder.num_features())
+                    values, labels = profile_results.results
+
+                    # store loading time
+                    seconds_loading = seconds_tokenizing + profile_results.seconds
+
+                    # shuffle if necessary
+                    if data_args['shuffle_after_load']:
+
+                        # reorder arrays by a random permutation of their indices
+                        rng = np.random.RandomState(data_args.get('load', {}).get('rng_seed', None))
+                        indices = rng.permutation(len(values))
+                        values = values[indices]
+                        labels = labels[indices]
+                    logger.info("Loaded {} samples...".format(len(values)))
+
+                    # split into training and test data (as views, same boundary as data_utils.split_data)
+                    logger.info("splitting dataset into training and testing sets...")
+                    train_size = int(data_fraction_train * len(labels))
+                    values_train, values_test = values[:train_size], values[train_size:]
+                    labels_train, labels_test = labels[:train_size], labels[train_size:]
+
+                # cache embedded dataset for subsequent runs
+                if cached is None:
+                    model_subset = embedder.model_subset
+                    embedding_cache_save(cache_key, (values_train, labels_train, values_test, labels_test), { 'subset': model_subset, 'time_in_seconds_loading': seconds_loading })
+
+                    # continue with the cached (memory-mapped) arrays, as later runs will
+                    (values_train, labels_train, values_test, labels_test), cache_info = embedding_cache_load(cache_key)
+
+
+                # setup classifier (prefer the dual formulation with fewer samples than features)
+                logger.info("Training on {}, Testing on {}...".format(len(values_train), len(values_test)))
+                dual = values_train.shape[0] < values_train.shape[1]
+                models = classifiers(dual=dual, num_features=values_train.shape[1])
+
+                # single-threaded classifiers train concurrently in worker processes,
+                # each memory-mapping the cached training set
+                num_workers = len([name for name,classifier in models if name not in multithreaded_classifiers])
+                pool = multiprocessing.Pool(processes=max(1, min(num_workers, num_threads)))
+                pending = {}
+                for classifier_name,classifier in models:
+                    if classifier_name not in multithreaded_classifiers:
+                        logger.info("Training %s classifier in worker process..." % classifier.__class__.__name__)
+                        pending[classifier_name] = pool.apply_async(training_worker, (classifier, cache_key))
+                pool.close()
+
+                # multithreaded classifiers train in this process meanwhile
+                fitted = {}
+                for classifier_name,classifier in models:
+                    if classifier_name in multithreaded_classifiers:
+
+                        # profiled training
+                        logger.info("Training %s classifier..." % classifier.__class__.__name__)
+                        profile_results = timed_training(classifier, values_train, labels_train)
+                        fitted[classifier_name] = (classifier, profile_results.seconds)
+
+                # collect workers' (classifier, seconds_training) results
+                for classifier_name,result in pending.items():
+                    fitted[classifier_name] = result.get()
+                pool.join()
+                trained = [fitted[classifier_name] for classifier_name,classifier in models]
+
+                # profiled testing of all linear classifiers in a single pass over the test set
+                linear = [classifier for classifier,seconds_training in trained if isinstance(classifier, linear_classifier_types)]
+                if len(linear):
+                    logger.info("Testing %s classifiers..." % ", ".join([classifier.__class__.__name__ for classifier in linear]))
+                    profile_results = timed_testing_linear(linear, values_test)
+                    predictions_linear = profile_results.results
+                    seconds_testing_linear = profile_results.seconds
+
+                for classifier,seconds_training in trained:
+
+                    # profiled testing
+                    if isinstance(classifier, linear_classifier_types):
+                        predictions = predictions_linear[:, linear.index(classifier)]
+                        seconds_testing = seconds_testing_linear
+                    else:
+                        logger.info("Testing %s classifier..." % classifier.__class__.__name__)
+                        profile_results = timed_testing(classifier, values_test)
+                        predictions = profile_results.results.astype(np.int8, copy=False)
+                        seconds_testing = profile_results.seconds
+                    # calculate metrics (all derived from a single confusion matrix)
+                    confusion_matrix    = binary_confusion_matrix(labels_test, predictions)
+                    TN, FP, FN, TP      = confusion_matrix.ravel()
+                    data_size           = confusion_matrix.sum()
+                    data_positive       = FN + TP
+                    data_negative       = TN + FP
+                    accuracy            = float(TP + TN) / data_size
+                    precision           = float(TP) / (TP + FP) if (TP + FP) else 0.0
+                    recall              = float(TP) / (TP + FN) if (TP + FN) else 0.0
+                    f1                  = 2 * precision * recall / (precision + recall) if (precision + recall) else 0.0
+                    # build results object (numbers as native JSON numbers)
+                    results = { 'classifier':   str(classifier.__class__.__name__),
+                                'data':    {    'source':                   str(data_source),
+                                                'testsize':                 int(data_size),
+                                                'positive':                 int(data_positive),
+                                                'negative':                 int(data_negative),
+                                                'time_in_seconds_loading':  float(seconds_loading),
+                                                'time_in_seconds_loading_cached':  None if seconds_loading_cached is None else float(seconds_loading_cached)
+                                           },
+                                'embedding': {  'model':                    str(embedder_model),
+                                                'subset':                   str(model_subset)
+                                            },
+                                'data_args':    data_args,
+                                'metrics': {    'TP':                       int(TP),
+                                                'FP':                       int(FP),
+                                                'TN':                       int(TN),
+                                                'FN':                       int(FN),
+                                                'accuracy':                 float(accuracy),
+                                                'precision':                float(precision),
+                                                'recall':                   float(recall),
+                                                'f1':                       float(f1),
+                                                'time_in_seconds_training': float(seconds_training),
+                                                'time_in_seconds_testing':  float(seconds_testing)
+                                            }
+                               }
+                    # ensure output directory exists
+                    if not os.path.isdir(dir_results):
+                        data_utils.mkdir_p(dir_results)
+                    # save json file
+                    filename_results = "{}_{}_{}.json".format(data_source, embedder_model, classifier.__class__.__name__)
+                    logger.info("Saving results to {}...".format(filename_results))
+                    with open(os.path.join(dir_results,filename_results), 'a') as outfile:
+                        json.dump(results, outfile, sort_keys=True, indent=4, separators=(',', ': '))
+                        outfile.write('\n')
@@ -4,7 +4,7 @@ import json
 import logging
 import h5py
 import shutil
-from data_utils import get_file, syslogger
+from .data_utils import get_file, syslogger
 logger = syslogger(__name__)
 
 
@@ -56,7 +56,7 @@ class AmazonReviews:
             for l in f:
                 try:
                     review_text, sentiment = self.process_amazon_json(l)
-                    yield review_text.decode("latin1"), sentiment
+                    yield review_text, sentiment
                 except BoringException as e:
                     #logger.info(e)
                     continue
@@ -105,4 +105,4 @@ def load_data(file_path='/data/amazon/reviews_Home_and_Kitchen.json.gz',
 
 if __name__=="__main__":
     data = load_data()
-    print data.next()
+    print(next(data))
@@ -1,14 +1,13 @@
 #!/usr/bin/env python
 import os, sys
 import re
-from itertools import izip_longest
 import random
 import csv
 import logging
 import numpy as np
-import data_utils
+from . import data_utils
 from zipfile import ZipFile
-from data_utils import get_file, to_one_hot
+from .data_utils import get_file, to_one_hot
 import jpype
 import glob
 import nltk
@@ -57,8 +56,8 @@ class ArabicTwitter:
 
         # use regex to find multiline tweets
         # memory inefficient, but captures multiline tweets
-        regex = re.compile("TWEET123START(.*?)TWEET789END", re.DOTALL)
-        with open(self.file_path, 'r') as f:
+        regex = re.compile(b"TWEET123START(.*?)TWEET789END", re.DOTALL)
+        with open(self.file_path, 'rb') as f:
             contents = f.read()
             lines = regex.findall(contents)
 
@@ -74,8 +73,8 @@ class ArabicTwitter:
         # attempt to tokenize
         try:
 
-            # model unicode literal
-            text_u = unicode(text, 'raw_unicode_escape')
+            # model unicode literal (tweets are kept as raw bytes)
+            text_u = text.decode('raw_unicode_escape')
 
             if os.environ.get('ARABIC_TOKENIZER', 'nltk') == 'stanford':
 
@@ -84,8 +83,8 @@ class ArabicTwitter:
                 line = bufferedReader.readLine()
                 tokenizedLine = self.tokenizerFactory.getTokenizer(self.StringReader(line)).tokenize()
 
-                # return utf-8 encoded tokens
-                tokens = [tok.toString().encode('utf-8') for tok in tokenizedLine]
+                # return tokens as str
+                tokens = [str(tok.toString()) for tok in tokenizedLine]
 
             else:
 
@@ -103,16 +102,16 @@ class ArabicTwitter:
     def twitter_strip(self, text):
 
         # positive and negative emoticons from initial twitter search
-        emoticons_pos = [':)', ':-)', ': )', ':D', '=)', '\xF0\x9F\x98\x82', '\xE2\x9D\xA4', '\xE2\x99\xA5', '\xF0\x9F\x98\x8D', '\xF0\x9F\x98\x98', '\xF0\x9F\x98\x8A', '\xF0\x9F\x91\x8C', '\xF0\x9F\x92\x95', '\xF0\x9F\x91\x8F', '\xF0\x9F\x98\x81']
-        emoticons_neg = [':(', ':-(', ': (', '\xF0\x9F\x98\xAD', '\xF0\x9F\x98\xA9', '\xF0\x9F\x98\x92', '\xF0\x9F\x98\x94', '\xF0\x9F\x98\xA1', '\xF0\x9F\x98\xB4', '\xF0\x9F\x94\xAB', '\xF0\x9F\x98\x9E', '\xF0\x9F\x98\xAA', '\xF0\x9F\x98\xAB']
+        emoticons_pos = [b':)', b':-)', b': )', b':D', b'=)', b'\xF0\x9F\x98\x82', b'\xE2\x9D\xA4', b'\xE2\x99\xA5', b'\xF0\x9F\x98\x8D', b'\xF0\x9F\x98\x98', b'\xF0\x9F\x98\x8A', b'\xF0\x9F\x91\x8C', b'\xF0\x9F\x92\x95', b'\xF0\x9F\x91\x8F', b'\xF0\x9F\x98\x81']
+        emoticons_neg = [b':(', b':-(', b': (', b'\xF0\x9F\x98\xAD', b'\xF0\x9F\x98\xA9', b'\xF0\x9F\x98\x92', b'\xF0\x9F\x98\x94', b'\xF0\x9F\x98\xA1', b'\xF0\x9F\x98\xB4', b'\xF0\x9F\x94\xAB', b'\xF0\x9F\x98\x9E', b'\xF0\x9F\x98\xAA', b'\xF0\x9F\x98\xAB']
 
         # strip retweets
         stripped = text
-        stripped = re.sub("RT @.*?: ",'',stripped)
+        stripped = re.sub(b"RT @.*?: ",b'',stripped)
 
         # strip emoticons
         for emoticon in emoticons_pos + emoticons_neg:
-            stripped = stripped.replace(emoticon,'')
+            stripped = stripped.replace(emoticon,b'')
 
         # return stripped text
         return stripped
@@ -129,11 +128,11 @@ class ArabicTwitter:
         """
 
         # use regex to find multiline (id,tweet,sentiment)
-        regex = re.compile("(\d{18}),(.*?),([0|1])\n", re.DOTALL)
+        regex = re.compile(rb"(\d{18}),(.*?),([0|1])\n", re.DOTALL)
 
         # iterate all files in specified directory
         for file_path in glob.glob(os.path.join(self.file_path, '*')):
-            with open(file_path, 'r') as f:
+            with open(file_path, 'rb') as f:
                 contents = f.read()
                 lines = regex.findall(contents)
 
@@ -153,8 +152,8 @@ class ArabicTwitterIterator:
     def __iter__(self):
         return self
 
-    def next(self):
-        text = self.data.next()
+    def __next__(self):
+        text = next(self.data)
 
         # increment and output progress of counter
         self.counter += 1
@@ -1,11 +1,12 @@
 import os, re, csv, errno, sys
 import logging
 import random
-from urllib2 import urlopen, HTTPError, URLError
-from nltk.tokenize import wordpunct_tokenize
+import time
+from urllib.request import urlopen
+from urllib.error import HTTPError, URLError
 import numpy as np
 import logging
-import cPickle as pickle
+import pickle
 from gensim.models import Doc2Vec, Word2Vec
 logging.basicConfig()
 logger=logging.getLogger(__name__)
@@ -28,8 +29,8 @@ class TextIterator:
     def __iter__(self):
         return self
 
-    def next(self):
-        text,sentiment = self.data.next()
+    def __next__(self):
+        text,sentiment = next(self.data)
         self.counter += 1
         return tokenize(text)
 
@@ -49,7 +50,7 @@ class DataSampler:
             Return the lowest number of samples of all class types
         '''
         if len(self.samples):
-            return min([len(samples) for samples in self.samples.itervalues()])
+            return min([len(samples) for samples in self.samples.values()])
         else:
             return 0
 
@@ -101,13 +102,13 @@ class DataSampler:
 
         # process each label type via either sampling or N-first
         random.seed(rng_seed)
-        for sentiment in self.samples.iterkeys():
+        for sentiment in self.samples.keys():
 
             # randomly sample among all possible
             if sample_after_load:
 
                 # generate subsample of random indices out of total available
-                indices = range(len(self.samples[sentiment]))
+                indices = list(range(len(self.samples[sentiment])))
                 random.shuffle(indices)
                 indices_sample = random.sample(indices, min_current_samples)
 
@@ -205,16 +206,16 @@ class WordVectorBuilder:
 
         # build vocabulary and model
         logger.info('building vocabulary...')
-        model = Word2Vec(size=size, window=window, min_count=min_count, workers=workers)
+        model = Word2Vec(vector_size=size, window=window, min_count=min_count, workers=workers)
         model.build_vocab(sentences)
 
         # train model
         logger.info('building word2vec model...')
-        model.train(sentences)
+        model.train(sentences, total_examples=model.corpus_count, epochs=model.epochs)
 
         # save model to disk
         logger.info('saving model to {}...'.format(model_path_full))
-        model.save_word2vec_format(model_path_full)
+        model.wv.save_word2vec_format(model_path_full)
 
 
 def mkdir_p(path):
@@ -231,8 +232,11 @@ def tokenize_hanzi(txt):
     return [tkn[0] for tkn in jieba.tokenize(txt)]
 
 
+# same pattern and flags as nltk's wordpunct_tokenize, compiled once so each call
+# goes straight to the regex engine instead of through the nltk tokenizer object
+wordpunct_regex = re.compile(r'\w+|[^\w\s]+', re.UNICODE | re.MULTILINE | re.DOTALL)
 def tokenize(txt):
-    return wordpunct_tokenize(txt)
+    return wordpunct_regex.findall(txt)
 
 
 def normalize(txt, vocab=None, replace_char=' ',
@@ -293,9 +297,9 @@ def normalize(txt, vocab=None, replace_char=' ',
     # replace chars
     if vocab is not None:
         txt = ''.join([c if c in vocab else replace_char for c in txt])
-    # re-encode text
+    # drop characters outside of encoding (text stays str)
     if encoding is not None:
-        txt = txt.encode(encoding, errors="ignore")
+        txt = txt.encode(encoding, errors="ignore").decode(encoding)
     # pad out if needed
     if pad_out and max_length>txt_len:
         txt = replace_char * (max_length - txt_len) + txt
@@ -342,7 +346,8 @@ def latin_csv_reader(csv_data, dialect=csv.excel, **kwargs):
         ASCII or UTF-8 encoding and convert's to Latin-1
 
         @Arguments:
-            csv_data -- a CSV file opened for reading
+            csv_data -- a CSV file opened for reading (in binary mode
+                to be decoded as Latin-1 here)
 
             dialect -- specifies the file dialect type
 
@@ -355,11 +360,12 @@ def latin_csv_reader(csv_data, dialect=csv.excel, **kwargs):
             CSV file
     '''
 
-    # Opens CSV reader
-    csv_reader = csv.reader(csv_data, dialect=dialect, **kwargs)
-    # Converts row to latin-1 encoding and yields this line on next() calls
+    # Decodes lines from latin-1 for the CSV reader
+    lines = (line.decode('latin-1') if isinstance(line, bytes) else line for line in csv_data)
+    csv_reader = csv.reader(lines, dialect=dialect, **kwargs)
+    # Yields each row on next() calls
     for row in csv_reader:
-        yield [unicode(cell, 'latin-1') for cell in row]
+        yield row
 
 
 def get_file(url, dest_path="./downloads"):
@@ -402,10 +408,10 @@ def get_file(url, dest_path="./downloads"):
         return fname
 
     # Handle errors
-    except HTTPError, e:
-        print "HTTP Error:", e.code, url
-    except URLError, e:
-        print "URL Error:", e.reason, url
+    except HTTPError as e:
+        print("HTTP Error:", e.code, url)
+    except URLError as e:
+        print("URL Error:", e.reason, url)
 
 
 def split_data(data, train=.7, dev=.2, test=.1, shuffle=False):
@@ -472,8 +478,8 @@ def preprocess_tweet(text):
     FLAGS = re.MULTILINE | re.DOTALL
 
     # Different regex parts for smiley faces
-    eyes = ur"[8:=;]"
-    nose = ur"['`\-]?"
+    eyes = r"[8:=;]"
+    nose = r"['`\-]?"
 
     # function so code less repetitive
     def re_sub(pattern, repl):
@@ -485,29 +491,29 @@ def preprocess_tweet(text):
         if hashtag_body.isupper():
             result = u"<hashtag> {} <allcaps>".format(hashtag_body)
         else:
-            result = u" ".join([u"<hashtag>"] + re.split(ur"(?=[A-Z])", hashtag_body, flags=FLAGS))
+            result = u" ".join([u"<hashtag>"] + re.split(r"(?=[A-Z])", hashtag_body, flags=FLAGS))
         return result
 
     def allcaps(text):
         text = text.group()
         return text.lower() + u" <allcaps>"
 
-    text = re_sub(ur"https?:\/\/\S+\b|www\.(\w+\.)+\S*", u"<url>")
-    text = re_sub(ur"/", " / ")
-    text = re_sub(ur"@\w+", u"<user>")
-    text = re_sub(ur"{}{}[)dD]+|[)dD]+{}{}".format(eyes, nose, nose, eyes), u"<smile>")
-    text = re_sub(ur"{}{}p+".format(eyes, nose), u"<lolface>")
-    text = re_sub(ur"{}{}\(+|\)+{}{}".format(eyes, nose, nose, eyes), u"<sadface>")
-    text = re_sub(ur"{}{}[\/|l*]".format(eyes, nose), u"<neutralface>")
-    text = re_sub(ur"<3", "<heart>")
-    text = re_sub(ur"[-+]?[.\d]*[\d]+[:,.\d]*", u"<number>")
-    text = re_sub(ur"#\S+", hashtag)
-    text = re_sub(ur"([!?.]){2,}", ur"\1 <repeat>")
+    text = re_sub(r"https?:\/\/\S+\b|www\.(\w+\.)+\S*", u"<url>")
+    text = re_sub(r"/", " / ")
+    text = re_sub(r"@\w+", u"<user>")
+    text = re_sub(r"{}{}[)dD]+|[)dD]+{}{}".format(eyes, nose, nose, eyes), u"<smile>")
+    text = re_sub(r"{}{}p+".format(eyes, nose), u"<lolface>")
+    text = re_sub(r"{}{}\(+|\)+{}{}".format(eyes, nose, nose, eyes), u"<sadface>")
+    text = re_sub(r"{}{}[\/|l*]".format(eyes, nose), u"<neutralface>")
+    text = re_sub(r"<3", "<heart>")
+    text = re_sub(r"[-+]?[.\d]*[\d]+[:,.\d]*", u"<number>")
+    text = re_sub(r"#\S+", hashtag)
+    text = re_sub(r"([!?.]){2,}", r"\1 <repeat>")
     #text = re_sub(r"\b(\S*?)(.)\2{2,}\b", r"\1\2 <elong>")
 
     ## -- I don't understand why the Ruby script adds <allcaps> to everything so I limited the selection.
     # text = re_sub(r"([^a-z0-9()<>'`\-]){2,}", allcaps)
-    text = re_sub(ur"([A-Z]){2,}", allcaps)
+    text = re_sub(r"([A-Z]){2,}", allcaps)
 
     return text.lower()
 
@@ -517,6 +523,7 @@ class ProfileResults():
     def __init__(self):
         self.results = None
         self.timer = None
+        self.seconds = None
 
 # decorator to profile execution time
 def timed(func):
@@ -536,6 +543,7 @@ def timed(func):
         pr.disable()
         ps = pstats.Stats(pr)
         profile_results.timer = ps
+        profile_results.seconds = ps.total_tt
 
         # return object with results and timer
         return profile_results
@@ -543,6 +551,23 @@ def timed(func):
     return func_wrapper
 
 
+# decorator to time execution without profiling every nested function call
+def timed_fast(func):
+    def func_wrapper(*args, **kwargs):
+        # return object
+        profile_results = ProfileResults()
+
+        # execute method
+        start = time.perf_counter()
+        profile_results.results = func(*args, **kwargs)
+        profile_results.seconds = time.perf_counter() - start
+
+        # return object with results and elapsed time
+        return profile_results
+
+    return func_wrapper
+
+
 def syslogger(name="logger"):
 
     # setup stdout logger
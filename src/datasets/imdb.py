@@ -7,7 +7,7 @@ import logging
 logging.basicConfig()
 logger=logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
-from data_utils import get_file, mkdir_p
+from .data_utils import get_file, mkdir_p
 
 pos_label = 1
 neg_label = 0
@@ -112,7 +112,7 @@ class IMDB:
     def load_data(self):
         for (file_path, sentiment) in self.data:
             # Open the movie review
-            f = open(file_path, 'r')
+            f = open(file_path, 'r', encoding='utf-8')
             yield (f.read(), sentiment)
             # Closes f on the following next() call by user
             f.close()
@@ -120,7 +120,7 @@ class IMDB:
 
 def main():
     data = load_data("/root/data/pcallier/imdb",None)
-    print data.next()
+    print(next(data))
 
 if __name__=="__main__":
     main()
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import argparse, sys, os
-import urllib
+import urllib.request
 import zipfile, gzip
 import glob
 import shutil
@@ -41,7 +41,7 @@ class ModelDownloader:
             self.download_and_save_vectors = self.download_and_save_vectors_word2vec
 
         else:
-            print 'BAD MODEL!'
+            print('BAD MODEL!')
 
 
     @staticmethod
@@ -85,7 +85,7 @@ class ModelDownloader:
         filename_save = "{}/{}".format(outdir, filename_full)
         if not os.path.isfile(filename_save):
             print("downloading {}...".format(filename_save))
-            urllib.urlretrieve(url, filename_save)
+            urllib.request.urlretrieve(url, filename_save)
 
         # extract file into file-specific output directory
         dirname_file = "{}/{}".format(outdir, filename_base)
@@ -114,7 +114,7 @@ class ModelDownloader:
                     with open(filepath_uncompressed, 'wb') as f:
                         shutil.copyfileobj(z, f)
             else:
-                print "Bad extension: {}".format(filename_ext)
+                print("Bad extension: {}".format(filename_ext))
 
         # notify to location of file
         return dirname_file
@@ -174,7 +174,7 @@ class ModelDownloader:
 
 
         except MemoryError as e:
-            print e.strerror
+            print(e.strerror)
 
         # remove extracted directory
         shutil.rmtree(dirname_file)
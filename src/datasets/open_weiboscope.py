@@ -1,15 +1,14 @@
 #!/usr/bin/env python
 import os, sys
 import re
-from itertools import izip_longest
 import random
 import csv
 import logging
 import numpy as np
-import data_utils
-from data_utils import tokenize, tokenize_hanzi
+from . import data_utils
+from .data_utils import tokenize, tokenize_hanzi
 from zipfile import ZipFile
-from data_utils import get_file, to_one_hot, syslogger
+from .data_utils import get_file, to_one_hot, syslogger
 
 download_all_csvs = False
 
@@ -117,13 +116,15 @@ def load_data(file_path, which_set='train', form='pinyin', train_pct=1.0, nr_rec
     nr_yielded = 0
     for table_path in data_sets[which_set]:
 
-        with open(table_path, 'rbU') as f:
+        # undecodable bytes are carried through as surrogates, so that
+        # records holding them are dropped by the strict decode below
+        with open(table_path, 'r', encoding='utf-8', errors='surrogateescape', newline='') as f:
             csv_reader = csv.reader(f, dialect=csv.excel)
 
             logging.debug("In file {}".format(table_path))
             for line in csv_reader:
                 try:
-                    records_split = [unicode(cell, 'utf-8') for cell in line]
+                    records_split = [cell.encode('utf-8', 'surrogateescape').decode('utf-8') for cell in line]
                     post_id = records_split[0]
                     
                     if len(records_split) != 11:
@@ -161,7 +162,7 @@ def load_data(file_path, which_set='train', form='pinyin', train_pct=1.0, nr_rec
                         # limit number of records retrieved?
                         nr_yielded += 1
                         if nr_records is not None and nr_yielded >= nr_records:
-                            raise StopIteration()
+                            return
                 # log various exception cases from loop body
                 except TextTooShortException:
                     logger.debug("Record {} thrown out (too short)".format(post_id))
@@ -254,8 +255,8 @@ class OpenWeiboIterator:
     def __iter__(self):
         return self
 
-    def next(self):
-        text,sentiment = self.data.next()
+    def __next__(self):
+        text,sentiment = next(self.data)
 
         # increment and output progress of counter
         self.counter += 1
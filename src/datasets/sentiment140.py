@@ -3,7 +3,7 @@ import logging
 import shutil
 import random
 logger = logging.getLogger(__name__)
-from data_utils import latin_csv_reader, get_file
+from .data_utils import latin_csv_reader, get_file
 from zipfile import ZipFile
 
 # Dictionaries that define the Sentiment features
@@ -85,12 +85,12 @@ class Sentiment140:
 
         # Open file path
         try:
-            twitter_csv = open(self.file_path, 'r')
+            twitter_csv = open(self.file_path, 'rb')
         except IOError as e:
             logger.exception("File I/O error, will try downloading...")
             logger.info("Downloading...")
             self.download_data(self.file_path)
-            twitter_csv = open(self.file_path, 'r')
+            twitter_csv = open(self.file_path, 'rb')
 
 
         # Perform parsing of CSV file
@@ -140,11 +140,11 @@ class Sentiment140:
             file.
         '''
         read_path = self.load_data(verbose=verbose)
-        with open(read_path, 'r') as twitter_csv, open(write_path, 'w') as output:
+        with open(read_path, 'rb') as twitter_csv, open(write_path, 'w', encoding='utf-8') as output:
             reader = latin_csv_reader(twitter_csv, delimiter=',')
             # For each line in CSV, write each tweet with a new line to the output
             for line in reader:
-                output.write(line[5].encode('UTF-8') + '\n')
+                output.write(line[5] + '\n')
 
 def main():
     # Download data (will save in ./.downloads)
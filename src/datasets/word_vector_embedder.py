@@ -1,16 +1,21 @@
 import os
 import numpy as np
 import re
+import pickle
 from glove.glove import Glove
-from gensim.models import Doc2Vec
-from model_downloader import ModelDownloader
-from data_utils import TextTooShortException
+from gensim.models import KeyedVectors
+from .model_downloader import ModelDownloader
+from .data_utils import TextTooShortException
 
 class WordVectorEmbedder:
     '''
         generic class to embed words into word vectors
     '''
 
+    # most word vectors gathered at once when averaging a batch (bounds the
+    # temporary (words x num_features) array for long texts such as reviews)
+    max_gather_words = 65536
+
 
     def __init__(self, model_type, model_fullpath=None, model_group=None, model_subset=None, model_args={}):
         '''
@@ -26,9 +31,8 @@ class WordVectorEmbedder:
                 model_subset    = 'GoogleNews-vectors-negative300.bin'
                 model_args      = { 'binary': True }
 
-            # setup importer and converter
-            self.model_import_method = Doc2Vec.load_word2vec_format
-            self.word_vector = self.word_vector_word2vec
+            # setup importer
+            self.model_import_method = KeyedVectors.load_word2vec_format
 
         elif self.model_type == 'glove':
 
@@ -38,9 +42,8 @@ class WordVectorEmbedder:
                 model_group     = 'twitter-2b'
                 model_subset    = 'glove.twitter.27B.200d'
 
-            # setup importer and converter
+            # setup importer
             self.model_import_method = Glove.load_obj
-            self.word_vector = self.word_vector_glove
 
         else:
             raise NameError("Error! You must specify a model type from: <word2vec|glove>")
@@ -56,37 +59,53 @@ class WordVectorEmbedder:
             # locate the model
             model_fullpath = downloader.download_fullpath(model_dir, model_subset)
 
-        # load the model
-        print("Loading model from {}...".format(model_fullpath))
-        self.model = self.model_import_method(model_fullpath, **model_args)
+        # memory-map vectors converted by an earlier run (shared by all processes using them)
+        path_vectors, path_vocab = self.__class__.filename_vectors(model_fullpath)
+        if os.path.isfile(path_vectors) and os.path.isfile(path_vocab):
+            print("Loading model vectors from {}...".format(path_vectors))
+            self.word_vectors = np.load(path_vectors, mmap_mode='r')
+            with open(path_vocab, 'rb') as f:
+                self.word_index = pickle.load(f)
 
-        # setup the word lookup
-        if self.model_type == 'word2vec':
-            self.word_set = set(self.model.index2word)
+        # otherwise load the model and save its vectors and vocabulary for next time
         else:
-            self.word_set = set(self.model.dictionary)
+            print("Loading model from {}...".format(model_fullpath))
+            model = self.model_import_method(model_fullpath, **model_args)
+            if self.model_type == 'word2vec':
+                self.word_index = model.key_to_index
+                self.word_vectors = model.vectors
+            else:
+                self.word_index = model.dictionary
+                self.word_vectors = model.word_vectors
+
+            # written to temporary files and renamed into place, vocabulary last,
+            # so an interrupted save never leaves a partial pair behind
+            print("Saving model vectors to {}...".format(path_vectors))
+            with open(path_vectors + '.tmp', 'wb') as f:
+                np.save(f, self.word_vectors)
+            with open(path_vocab + '.tmp', 'wb') as f:
+                pickle.dump(self.word_index, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(path_vectors + '.tmp', path_vectors)
+            os.replace(path_vocab + '.tmp', path_vocab)
+
+
+    @staticmethod
+    def filename_vectors(model_fullpath):
+        '''
+            Generate the names of the vector matrix and vocabulary saved alongside a model
+        '''
+        return ('{}.vectors.npy'.format(model_fullpath), '{}.vocab.pkl'.format(model_fullpath))
 
 
     def num_features(self):
-        if self.model_type == 'word2vec':
-            return self.model.vector_size
-        else:
-            return self.model.no_components
+        return self.word_vectors.shape[1]
 
 
-    def word_vector_glove(self, word):
+    def word_vector(self, word):
         '''
-            get glove vector for given word
+            get vector for given word
         '''
-        word_idx = self.model.dictionary[word]
-        return self.model.word_vectors[word_idx]
-
-
-    def word_vector_word2vec(self, word):
-        '''
-            get glove vector for given word
-        '''
-        return self.model[word]
+        return self.word_vectors[self.word_index[word]]
 
 
     def embed_words_into_vectors(self, words, num_features=None):
@@ -119,7 +138,7 @@ class WordVectorEmbedder:
             # pad if necessary by appending right-sized 0 vectors
             else:
                 padding_length = num_features - len(vectors)
-                for i in xrange(padding_length):
+                for i in range(padding_length):
                     vectors.append(np.zeros(self.num_features()))
 
         # return ndarray of embedded words
@@ -139,20 +158,76 @@ class WordVectorEmbedder:
         # paragraph
 
         # choose model
+        word_ids = self.embed_words_into_ids(words)
         if self.model_type == 'glove':
-            word_ids = [self.model.dictionary[word] for word in words if word in self.word_set]
-            return np.nan_to_num(np.mean(self.model.word_vectors[word_ids], axis=0))
+            return np.nan_to_num(np.mean(self.word_vectors[word_ids], axis=0))
         else:
 
             # process valid words
-            valid_words = [word for word in words if word in self.word_set]
-            if len(valid_words):
+            if len(word_ids):
 
                 # get vectors for valid words
-                vectors = self.word_vector(valid_words)
+                vectors = self.word_vectors[word_ids]
 
                 # find the average/paragraph vector
                 return np.nan_to_num(np.mean(vectors, axis=0))
 
             else:
                 raise TextTooShortException()
+
+
+    def embed_words_into_ids(self, words):
+        '''
+            map words into row indices of the model's vector matrix
+        '''
+        word_index = self.word_index
+        return np.array([word_index[word] for word in words if word in word_index], dtype=np.int64)
+
+
+    def embed_batch_into_vectors_averaged(self, batch):
+        '''
+            embed a batch of tokenized texts into the model's averaged vector space
+
+            averages are computed with a gather of the word vectors of consecutive
+            texts (at most max_gather_words at a time) followed by a segmented sum,
+            rather than one mean per text
+
+            @Arguments:
+                batch   --  list of token lists
+
+            @Returns:
+                (vectors, valid) tuple, where vectors is a (len(batch), num_features)
+                float32 array and valid flags the texts to keep (word2vec texts
+                without any known word are rejected, as in embed_words_into_vectors_averaged)
+        '''
+
+        # collect word ids for every text into a flat array
+        ids = [self.embed_words_into_ids(words) for words in batch]
+        lengths = np.fromiter((len(word_ids) for word_ids in ids), dtype=np.int32, count=len(ids))
+        nonempty = lengths > 0
+
+        # texts without known words average to 0 vectors
+        vectors = np.zeros((len(batch), self.word_vectors.shape[1]), dtype=np.float32)
+        if nonempty.any():
+            rows = np.flatnonzero(nonempty)
+            lengths_nonempty = lengths[nonempty]
+            ends = np.cumsum(lengths_nonempty)
+            starts = ends - lengths_nonempty
+            ids = np.concatenate(ids)
+
+            # gather and sum texts in chunks of at most max_gather_words words
+            # (a longer text is gathered on its own)
+            first = 0
+            while first < len(rows):
+                last = max(first + 1, np.searchsorted(ends, starts[first] + self.max_gather_words, side='right'))
+                sums = np.add.reduceat(self.word_vectors[ids[starts[first]:ends[last-1]]], starts[first:last] - starts[first], axis=0)
+                vectors[rows[first:last]] = np.nan_to_num(sums / lengths_nonempty[first:last, None])
+                first = last
+
+        # word2vec rejects texts without any known word
+        if self.model_type == 'word2vec':
+            valid = nonempty
+        else:
+            valid = np.ones(len(batch), dtype=bool)
+
+        return vectors, valid